@@ -243,6 +243,10 @@ class PrinterLCD:
         self.redraw_request_pending = True
         self.reactor.update_timer(self.screen_update_timer, self.redraw_time)
     def draw_text(self, row, col, mixed_text, eventtime):
+        if '~' not in mixed_text:
+            # plain text without glyphs
+            self.lcd_chip.write_text(col, row, mixed_text.encode())
+            return col + len(mixed_text)
         pos = col
         for i, text in enumerate(mixed_text.split('~')):
             if i & 1 == 0:
@@ -4,10 +4,15 @@
 # Copyright (C) 2020  Janar Sööt <janar.soot@gmail.com>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import os, logging, ast, re
+import os, logging, ast, re, collections
 from string import Template
 from . import menu_keys
 
+# Splits a name into text and ~glyph~ placeholder chunks
+GLYPH_RE = re.compile(r'(\~.*?\~)')
+# Common results of a rendered 'enable' template
+BOOL_LITERALS = {'True': True, 'False': False, '1': True, '0': False}
+
 
 class sentinel:
     pass
@@ -29,25 +34,29 @@ class MenuElement(object):
         self._index = kwargs.get('index', None)
         self._enable = kwargs.get('enable', True)
         self._name = kwargs.get('name', None)
-        self._enable_tpl = self._name_tpl = None
+        self._enable_tpl = self._name_tpl = self._flat_name = None
         if config is not None:
             # overwrite class attributes from config
             self._index = config.getint('index', self._index)
-            self._name_tpl = manager.gcode_macro.load_template(
-                config, 'name', self._name)
+            # names without template markup don't need to be rendered
+            self._name = config.get('name', self._name)
+            if self._name is None or '{' in self._name:
+                self._name_tpl = manager.gcode_macro.load_template(
+                    config, 'name', self._name)
             try:
                 self._enable = config.getboolean('enable', self._enable)
             except config.error:
                 self._enable_tpl = manager.gcode_macro.load_template(
                     config, 'enable')
             # item namespace - used in relative paths
-            self._ns = str(" ".join(config.get_name().split(' ')[1:])).strip()
+            self._ns = config.get_name().partition(' ')[2].strip()
         else:
             # ns - item namespace key, used in item relative paths
             # $__id - generated id text variable
             __id = '__menu_' + hex(id(self)).lstrip("0x").rstrip("L")
             self._ns = Template(
                 'menu ' + kwargs.get('ns', __id)).safe_substitute(__id=__id)
+        self._ns_cache = {}
         self._last_heartbeat = None
         self.__scroll_pos = None
         self.__scroll_request_pending = False
@@ -65,7 +74,10 @@ class MenuElement(object):
         if self._name_tpl is not None:
             context = self.get_context()
             return self.manager.asflat(self._name_tpl.render(context))
-        return self.manager.asflat(self._name)
+        if self._flat_name is None:
+            # static names only need to be flattened once
+            self._flat_name = self.manager.asflat(self._name)
+        return self._flat_name
 
     def _load_script(self, config, name, option=None):
         """Load script template from config or callback from dict"""
@@ -77,8 +89,12 @@ class MenuElement(object):
         if isinstance(config, dict):
             self._scripts[name] = config.get(option, None)
         else:
-            self._scripts[name] = self.manager.gcode_macro.load_template(
-                config, option, '')
+            # scripts without template markup are stored as static strings
+            script = config.get(option, '')
+            if '{' in script:
+                script = self.manager.gcode_macro.load_template(
+                    config, option, '')
+            self._scripts[name] = script
 
     # override
     def is_editing(self):
@@ -90,6 +106,8 @@ class MenuElement(object):
 
     # override
     def is_enabled(self):
+        if self._enable_tpl is None:
+            return bool(self._enable)
         context = self.get_context()
         return self.eval_enable(context)
 
@@ -112,7 +130,10 @@ class MenuElement(object):
 
     def eval_enable(self, context):
         if self._enable_tpl is not None:
-            return bool(ast.literal_eval(self._enable_tpl.render(context)))
+            value = self._enable_tpl.render(context).strip()
+            if value in BOOL_LITERALS:
+                return BOOL_LITERALS[value]
+            return bool(ast.literal_eval(value))
         return bool(self._enable)
 
     # Called when a item is selected
@@ -123,19 +144,21 @@ class MenuElement(object):
         self._last_heartbeat = eventtime
         if eventtime >= self.__scroll_next:
             self.__scroll_next = eventtime + 0.5
-            if not self.is_editing():
+            if self.is_scrollable() and not self.is_editing():
                 self.__update_scroller()
 
     def __update_scroller(self):
-        if self.__scroll_pos is None and self.__scroll_request_pending is True:
-            self.__scroll_pos = 0
-        elif self.__scroll_request_pending is True:
-            self.__scroll_pos += 1
-            self.__scroll_request_pending = False
-        elif self.__scroll_request_pending is False:
-            pass  # hold scroll position
-        elif self.__scroll_request_pending is None:
+        pending = self.__scroll_request_pending
+        if pending is None:
             self.__reset_scroller()
+        elif pending is True:
+            if self.__scroll_pos is None:
+                self.__scroll_pos = 0
+            else:
+                self.__scroll_pos += 1
+                self.__scroll_request_pending = False
+        elif pending is False:
+            pass  # hold scroll position
 
     def __reset_scroller(self):
         self.__scroll_pos = None
@@ -152,16 +175,24 @@ class MenuElement(object):
         self.__scroll_request_pending = value
 
     def __slice_name(self, name, index):
+        if '~' not in name:
+            return name[index:]
         chunks = []
-        for i, text in enumerate(re.split(r'(\~.*?\~)', name)):
+        for i, text in enumerate(GLYPH_RE.split(name)):
             if i & 1 == 0:  # text
-                chunks += text
+                if index < len(text):
+                    chunks.append(text[index:])
+                    index = 0
+                else:
+                    index -= len(text)
+            elif index > 0:  # skipped glyph placeholder
+                index -= 1
             else:  # glyph placeholder
                 chunks.append(text)
-        return "".join(chunks[index:])
+        return "".join(chunks)
 
     def render_name(self, selected=False):
-        name = str(self._render_name())
+        name = self._render_name()
         if selected and self.__scroll_pos is not None:
             name = self.__slice_name(name, self.__scroll_pos)
         else:
@@ -169,12 +200,18 @@ class MenuElement(object):
         return name
 
     def get_ns(self, name='.'):
+        # resolved names are cached, the item namespace doesn't change
+        ns = self._ns_cache.get(name)
+        if ns is None:
+            ns = self._ns_cache[name] = self._resolve_ns(name)
+        return ns
+
+    def _resolve_ns(self, name):
         name = str(name).strip()
         if name.startswith('..'):
-            name = ' '.join(
-                [(' '.join(str(self._ns).split(' ')[:-1])), name[2:]])
+            name = ' '.join([self._ns.rpartition(' ')[0], name[2:]])
         elif name.startswith('.'):
-            name = ' '.join([str(self._ns), name[1:]])
+            name = ' '.join([self._ns, name[1:]])
         return name.strip()
 
     def send_event(self, event, *args):
@@ -245,6 +282,8 @@ class MenuContainer(MenuElement):
         self._allitems = []
         self._names = []
         self._items = []
+        self._name_index = {}
+        self._item_index = {}
 
     def init(self):
         super(MenuContainer, self).init()
@@ -260,7 +299,7 @@ class MenuContainer(MenuElement):
         return isinstance(item, MenuElement)
 
     def is_editing(self):
-        return any([item.is_editing() for item in self._items])
+        return any(item.is_editing() for item in self._items)
 
     def stop_editing(self):
         for item in self._items:
@@ -281,16 +320,11 @@ class MenuContainer(MenuElement):
         return self.lookup_item(item)
 
     def _index_of(self, item):
-        try:
-            index = None
-            if isinstance(item, str):
-                s = item.strip()
-                index = self._names.index(s)
-            elif isinstance(item, MenuElement):
-                index = self._items.index(item)
-            return index
-        except ValueError:
-            return None
+        if isinstance(item, str):
+            return self._name_index.get(item.strip())
+        elif isinstance(item, MenuElement):
+            return self._item_index.get(item)
+        return None
 
     def index_of(self, item, look_inside=False):
         index = self._index_of(item)
@@ -346,9 +380,18 @@ class MenuContainer(MenuElement):
         self.send_event('populate', self)
 
     def update_items(self):
-        _a = [(item, name) for item, name in self._allitems
-              if item.is_enabled()]
-        self._items, self._names = zip(*_a) or ([], [])
+        items = []
+        names = []
+        item_index = {}
+        name_index = {}
+        for item, name in self._allitems:
+            if item.is_enabled():
+                item_index.setdefault(item, len(items))
+                name_index.setdefault(name, len(names))
+                items.append(item)
+                names.append(name)
+        self._items, self._names = items, names
+        self._item_index, self._name_index = item_index, name_index
 
     # select methods
     def init_selection(self):
@@ -379,18 +422,20 @@ class MenuContainer(MenuElement):
             return None
 
     def select_next(self):
+        count = len(self)
         if not isinstance(self.selected, int):
-            index = 0 if len(self) else None
-        elif 0 <= self.selected < len(self) - 1:
+            index = 0 if count else None
+        elif 0 <= self.selected < count - 1:
             index = self.selected + 1
         else:
             index = self.selected
         return self.select_at(index)
 
     def select_prev(self):
+        count = len(self)
         if not isinstance(self.selected, int):
-            index = 0 if len(self) else None
-        elif 0 < self.selected < len(self):
+            index = 0 if count else None
+        elif 0 < self.selected < count:
             index = self.selected - 1
         else:
             index = self.selected
@@ -493,14 +538,23 @@ class MenuInput(MenuCommand):
         return context
 
     def is_enabled(self):
+        if self._enable_tpl is None:
+            return bool(self._enable)
         context = super(MenuInput, self).get_context()
         return self.eval_enable(context)
 
+    def _eval_float(self, tpl, context):
+        value = tpl.render(context)
+        try:
+            # plain numbers don't need to be parsed as a python literal
+            return float(value)
+        except ValueError:
+            return float(ast.literal_eval(value))
+
     def _eval_min(self, context):
         try:
             if self._input_min_tpl is not None:
-                return float(ast.literal_eval(
-                    self._input_min_tpl.render(context)))
+                return self._eval_float(self._input_min_tpl, context)
             return float(self._input_min)
         except ValueError:
             logging.exception("Input min value evaluation error")
@@ -508,8 +562,7 @@ class MenuInput(MenuCommand):
     def _eval_max(self, context):
         try:
             if self._input_max_tpl is not None:
-                return float(ast.literal_eval(
-                    self._input_max_tpl.render(context)))
+                return self._eval_float(self._input_max_tpl, context)
             return float(self._input_max)
         except ValueError:
             logging.exception("Input max value evaluation error")
@@ -517,8 +570,7 @@ class MenuInput(MenuCommand):
     def _eval_value(self, context):
         try:
             if self._input_tpl is not None:
-                return float(ast.literal_eval(
-                    self._input_tpl.render(context)))
+                return self._eval_float(self._input_tpl, context)
             return float(self._input)
         except ValueError:
             logging.exception("Input value evaluation error")
@@ -544,37 +596,28 @@ class MenuInput(MenuCommand):
                 (self._input_max - self._input_min) / self._input_step > 100.0)
                 else self._input_step)
 
-    def inc_value(self, fast_rate=False):
+    def _step_value(self, step):
         last_value = self._input_value
-        if self._input_value is None:
-            return
-
-        input_step = self._get_input_step(fast_rate)
-        self._input_value += abs(input_step)
         self._input_value = min(self._input_max, max(
-            self._input_min, self._input_value))
-
+            self._input_min, last_value + step))
         if last_value != self._input_value:
             self._value_changed()
 
-    def dec_value(self, fast_rate=False):
-        last_value = self._input_value
+    def inc_value(self, fast_rate=False):
         if self._input_value is None:
             return
+        self._step_value(abs(self._get_input_step(fast_rate)))
 
-        input_step = self._get_input_step(fast_rate)
-        self._input_value -= abs(input_step)
-        self._input_value = min(self._input_max, max(
-            self._input_min, self._input_value))
-
-        if last_value != self._input_value:
-            self._value_changed()
+    def dec_value(self, fast_rate=False):
+        if self._input_value is None:
+            return
+        self._step_value(-abs(self._get_input_step(fast_rate)))
 
     # default behaviour on click
     def handle_script_click(self):
         if not self.is_editing():
             self.start_editing()
-        elif self.is_editing():
+        else:
             self.stop_editing()
 
 
@@ -599,8 +642,10 @@ class MenuList(MenuContainer):
         self.insert_item(self._itemBack, 0)
 
     def draw_container(self, nrows, eventtime):
-        display = self.manager.display
+        draw_text = self.manager.display.draw_text
+        cols = self.manager.cols
         selected_row = self.selected
+        count = len(self)
         # adjust viewport
         if selected_row is not None:
             if selected_row >= (self._viewport_top + nrows):
@@ -610,40 +655,39 @@ class MenuList(MenuContainer):
         else:
             self._viewport_top = 0
         # clamps viewport
-        self._viewport_top = max(0, min(self._viewport_top, len(self) - nrows))
+        self._viewport_top = max(0, min(self._viewport_top, count - nrows))
+        blank = ' ' * cols
         try:
             y = 0
             for row in range(self._viewport_top, self._viewport_top + nrows):
-                text = ""
-                prefix = ""
-                suffix = ""
-                if row < len(self):
-                    current = self[row]
-                    selected = (row == selected_row)
-                    if selected:
-                        current.heartbeat(eventtime)
-                    text = current.render_name(selected)
-                    # add prefix (selection indicator)
-                    if selected and not current.is_editing():
-                        prefix = current.cursor
-                    elif selected and current.is_editing():
-                        prefix = '*'
-                    else:
-                        prefix = ' '
-                    # add suffix (folder indicator)
-                    if isinstance(current, MenuList):
-                        suffix += '>'
+                if row >= count:
+                    # draw empty row
+                    draw_text(y, 0, blank, eventtime)
+                    y += 1
+                    continue
+                current = self[row]
+                selected = (row == selected_row)
+                if selected:
+                    current.heartbeat(eventtime)
+                text = current.render_name(selected)
+                # add prefix (selection indicator)
+                if not selected:
+                    prefix = ' '
+                elif current.is_editing():
+                    prefix = '*'
+                else:
+                    prefix = current.cursor
+                # add suffix (folder indicator)
+                suffix = ''
+                if isinstance(current, MenuList):
+                    suffix = '>'
                 # draw to display
-                plen = len(prefix)
                 slen = len(suffix)
-                width = self.manager.cols - plen - slen
-                # draw item prefix (cursor)
-                ppos = display.draw_text(y, 0, prefix, eventtime)
-                # draw item name
-                tpos = display.draw_text(y, ppos, text.ljust(width), eventtime)
+                width = cols - len(prefix) - slen
+                # draw item prefix (cursor) and name in one pass
+                tpos = draw_text(y, 0, prefix + text.ljust(width), eventtime)
                 # check scroller
-                if (selected and tpos > self.manager.cols
-                        and current.is_scrollable()):
+                if (selected and tpos > cols and current.is_scrollable()):
                     # scroll next
                     current.need_scroller(True)
                 else:
@@ -651,8 +695,7 @@ class MenuList(MenuContainer):
                     current.need_scroller(None)
                 # draw item suffix
                 if suffix:
-                    display.draw_text(
-                        y, self.manager.cols - slen, suffix, eventtime)
+                    draw_text(y, cols - slen, suffix, eventtime)
                 # next display row
                 y += 1
         except Exception:
@@ -662,15 +705,22 @@ class MenuList(MenuContainer):
 class MenuVSDList(MenuList):
     def __init__(self, manager, config, **kwargs):
         super(MenuVSDList, self).__init__(manager, config, **kwargs)
+        self._files = None
+        self._file_items = []
 
     def _populate(self):
         super(MenuVSDList, self)._populate()
         sdcard = self.manager.printer.lookup_object('virtual_sdcard', None)
         if sdcard is not None:
             files = sdcard.get_file_list()
-            for fname, fsize in files:
-                self.insert_item(self.manager.menuitem_from(
-                    'command', name=repr(fname), gcode='M23 /%s' % str(fname)))
+            # only rebuild file items when the file list has changed
+            if files != self._files:
+                self._files = files
+                self._file_items = [self.manager.menuitem_from(
+                    'command', name=repr(fname), gcode='M23 /%s' % fname)
+                    for fname, fsize in files]
+            for item in self._file_items:
+                self.insert_item(item)
 
 
 menu_items = {
@@ -695,7 +745,7 @@ class MenuManager:
         self.printer = config.get_printer()
         self.pconfig = self.printer.lookup_object('configfile')
         self.gcode = self.printer.lookup_object('gcode')
-        self.gcode_queue = []
+        self.gcode_queue = collections.deque()
         self.context = {}
         self.root = None
         self._root = config.get('menu_root', '__main')
@@ -711,6 +761,15 @@ class MenuManager:
         self.printer.add_object('menu', self)
         self.printer.register_event_handler("klippy:ready", self.handle_ready)
         # register for key events
+        self._key_handlers = {
+            'click': (lambda e: self._click_callback(e, 'click')),
+            'long_click': (lambda e: self._click_callback(e, 'long_click')),
+            'up': (lambda e: self.up(False)),
+            'fast_up': (lambda e: self.up(True)),
+            'down': (lambda e: self.down(False)),
+            'fast_down': (lambda e: self.down(True)),
+            'back': (lambda e: self.back())
+        }
         menu_keys.MenuKeys(config, self.key_event)
         # Load local config file in same directory as current module
         self.load_config(os.path.dirname(__file__), 'menu.cfg')
@@ -779,9 +838,12 @@ class MenuManager:
         return ""
 
     def get_context(self, cxt=None):
+        # items only update the nested 'menu' dict, which a shallow copy
+        # shares anyway, so only copy when extra values are merged in
+        if not isinstance(cxt, dict):
+            return self.context
         context = dict(self.context)
-        if isinstance(cxt, dict):
-            context.update(cxt)
+        context.update(cxt)
         return context
 
     def update_context(self, eventtime):
@@ -816,8 +878,6 @@ class MenuManager:
                 raise error("Wrong type, expected MenuContainer")
             top = self.stack_peek()
             if top is not None:
-                if not isinstance(container, MenuContainer):
-                    raise error("Wrong type, expected MenuContainer")
                 if not top.is_editing() and update is True:
                     top.update_items()
                     top.init_selection()
@@ -834,10 +894,9 @@ class MenuManager:
         return len(self.menustack)
 
     def stack_peek(self, lvl=0):
-        container = None
-        if self.stack_size() > lvl:
-            container = self.menustack[self.stack_size() - lvl - 1]
-        return container
+        if lvl < len(self.menustack):
+            return self.menustack[-1 - lvl]
+        return None
 
     def screen_update_event(self, eventtime):
         # screen update
@@ -950,13 +1009,16 @@ class MenuManager:
         self.gcode_queue.append(script)
 
     def dispatch_gcode(self, eventtime):
-        while self.gcode_queue:
-            script = self.gcode_queue[0]
-            try:
-                self.gcode.run_script(script)
-            except Exception:
-                logging.exception("Script running error")
-            self.gcode_queue.pop(0)
+        script = self.gcode_queue[0]
+        try:
+            self.gcode.run_script(script)
+        except Exception:
+            logging.exception("Script running error")
+        self.gcode_queue.popleft()
+        if self.gcode_queue:
+            # yield to the reactor between queued scripts
+            reactor = self.printer.get_reactor()
+            reactor.register_callback(self.dispatch_gcode)
 
     def menuitem_from(self, type, **kwargs):
         if type not in menu_items:
@@ -985,17 +1047,14 @@ class MenuManager:
     def lookup_menuitem(self, name, default=sentinel):
         if name is None:
             return None
-        if name in self.menuitems:
-            return self.menuitems[name]
-        if default is sentinel:
+        item = self.menuitems.get(name, default)
+        if item is sentinel:
             raise self.printer.config_error(
                 "Unknown menuitem '%s'" % (name,))
-        return default
+        return item
 
     def lookup_children(self, ns):
-        if ns in self.children:
-            return list(self.children[ns])
-        return list()
+        return self.children.get(ns, [])
 
     def load_config(self, *args):
         cfg = None
@@ -1026,20 +1085,9 @@ class MenuManager:
             self.begin(eventtime)
 
     def key_event(self, key, eventtime):
-        if key == 'click':
-            self._click_callback(eventtime, key)
-        elif key == 'long_click':
-            self._click_callback(eventtime, key)
-        elif key == 'up':
-            self.up(False)
-        elif key == 'fast_up':
-            self.up(True)
-        elif key == 'down':
-            self.down(False)
-        elif key == 'fast_down':
-            self.down(True)
-        elif key == 'back':
-            self.back()
+        handler = self._key_handlers.get(key)
+        if handler is not None:
+            handler(eventtime)
         self.display.request_redraw()
 
     # Collection of manager class helper methods
@@ -1047,9 +1095,7 @@ class MenuManager:
     @classmethod
     def stripliterals(cls, s):
         """Literals are beginning or ending by the double or single quotes"""
-        s = str(s)
-        if (s.startswith('"') and s.endswith('"')) or \
-                (s.startswith("'") and s.endswith("'")):
+        if s[:1] in ('"', "'") and s[-1:] == s[:1]:
             s = s[1:-1]
         return s
 
@@ -30,8 +30,8 @@ class MenuKeys:
                                             encoder_steps_per_detent)
         self.encoder_fast_rate = config.getfloat('encoder_fast_rate',
                                                  .030, above=0.)
-        self.last_encoder_cw_eventtime = 0
-        self.last_encoder_ccw_eventtime = 0
+        self.last_encoder_eventtime = 0
+        self.last_encoder_key = None
         # Register click button
         self.is_short_click = False
         self.click_timer = self.reactor.register_timer(self.long_click_event)
@@ -61,23 +61,23 @@ class MenuKeys:
             buttons.register_adc_button(pin, amin, amax, pullup, callback)
 
     # Rotary encoder callbacks
-    def encoder_cw_callback(self, eventtime):
-        fast_rate = ((eventtime - self.last_encoder_cw_eventtime)
+    def encoder_event(self, key, fast_key, eventtime):
+        # Only consecutive steps in the same direction count as fast
+        fast_rate = (key == self.last_encoder_key
+                     and (eventtime - self.last_encoder_eventtime)
                      <= self.encoder_fast_rate)
-        self.last_encoder_cw_eventtime = eventtime
+        self.last_encoder_eventtime = eventtime
+        self.last_encoder_key = key
         if fast_rate:
-            self.callback('fast_up', eventtime)
+            self.callback(fast_key, eventtime)
         else:
-            self.callback('up', eventtime)
+            self.callback(key, eventtime)
+
+    def encoder_cw_callback(self, eventtime):
+        self.encoder_event('up', 'fast_up', eventtime)
 
     def encoder_ccw_callback(self, eventtime):
-        fast_rate = ((eventtime - self.last_encoder_ccw_eventtime)
-                     <= self.encoder_fast_rate)
-        self.last_encoder_ccw_eventtime = eventtime
-        if fast_rate:
-            self.callback('fast_down', eventtime)
-        else:
-            self.callback('down', eventtime)
+        self.encoder_event('down', 'fast_down', eventtime)
 
     # Click handling
     def long_click_event(self, eventtime):
@@ -54,6 +54,7 @@ class DS18B20:
         next_clock      = self._mcu.clock32_to_clock64(params['next_clock'])
         last_read_clock = next_clock - self._report_clock
         last_read_time  = self._mcu.clock_to_print_time(last_read_clock)
+        self.temp = temp
         self._callback(last_read_time, temp)
 
     def setup_minmax(self, min_temp, max_temp):
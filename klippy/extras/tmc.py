@@ -26,6 +26,7 @@ class FieldHelper:
             self.registers = collections.OrderedDict()
         self.field_to_register = { f: r for r, fields in self.all_fields.items()
                                    for f in fields }
+        self.sorted_fields = {}
     def lookup_register(self, field_name, default=None):
         return self.field_to_register.get(field_name, default)
     def get_field(self, field_name, reg_value=None, reg_name=None):
@@ -65,8 +66,12 @@ class FieldHelper:
         return self.set_field(field_name, val)
     def pretty_format(self, reg_name, reg_value):
         # Provide a string description of a register
-        reg_fields = self.all_fields.get(reg_name, {})
-        reg_fields = sorted([(mask, name) for name, mask in reg_fields.items()])
+        reg_fields = self.sorted_fields.get(reg_name)
+        if reg_fields is None:
+            reg_fields = self.all_fields.get(reg_name, {})
+            reg_fields = sorted([(mask, name)
+                                 for name, mask in reg_fields.items()])
+            self.sorted_fields[reg_name] = reg_fields
         fields = []
         for mask, field_name in reg_fields:
             field_value = self.get_field(field_name, reg_value, reg_name)
@@ -235,6 +240,7 @@ class TMCCommandHelper:
         self.echeck_helper = TMCErrorCheck(config, mcu_tmc)
         self.fields = mcu_tmc.get_fields()
         self.read_registers = self.read_translate = None
+        self.read_registers_set = frozenset()
         self.toff = None
         self.mcu_phase_offset = None
         self.stepper = None
@@ -421,6 +427,7 @@ class TMCCommandHelper:
     # DUMP_TMC support
     def setup_register_dump(self, read_registers, read_translate=None):
         self.read_registers = read_registers
+        self.read_registers_set = frozenset(read_registers)
         self.read_translate = read_translate
         gcode = self.printer.lookup_object("gcode")
         gcode.register_mux_command("DUMP_TMC", "STEPPER", self.name,
@@ -433,10 +440,10 @@ class TMCCommandHelper:
         if reg_name is not None:
             reg_name = reg_name.upper()
             val = self.fields.registers.get(reg_name)
-            if (val is not None) and (reg_name not in self.read_registers):
+            if (val is not None) and (reg_name not in self.read_registers_set):
                 # write-only register
                 gcmd.respond_info(self.fields.pretty_format(reg_name, val))
-            elif reg_name in self.read_registers:
+            elif reg_name in self.read_registers_set:
                 # readable register
                 val = self.mcu_tmc.get_register(reg_name)
                 if self.read_translate is not None:
@@ -445,16 +452,17 @@ class TMCCommandHelper:
             else:
                 raise gcmd.error("Unknown register name '%s'" % (reg_name))
         else:
-            gcmd.respond_info("========== Write-only registers ==========")
+            out = ["========== Write-only registers =========="]
             for reg_name, val in self.fields.registers.items():
-                if reg_name not in self.read_registers:
-                    gcmd.respond_info(self.fields.pretty_format(reg_name, val))
-            gcmd.respond_info("========== Queried registers ==========")
+                if reg_name not in self.read_registers_set:
+                    out.append(self.fields.pretty_format(reg_name, val))
+            out.append("========== Queried registers ==========")
             for reg_name in self.read_registers:
                 val = self.mcu_tmc.get_register(reg_name)
                 if self.read_translate is not None:
                     reg_name, val = self.read_translate(reg_name, val)
-                gcmd.respond_info(self.fields.pretty_format(reg_name, val))
+                out.append(self.fields.pretty_format(reg_name, val))
+            gcmd.respond_info("\n".join(out))
 
 
 ######################################################################
@@ -274,13 +274,15 @@ class TMC5160CurrentHelper:
                                        above=0., maxval=MAX_CURRENT)
         self.req_hold_current = hold_current
         self.sense_resistor = config.getfloat('sense_resistor', 0.075, above=0.)
+        # Constant part of the globalscaler and current bits calculations
+        self.gscaler_factor = 256. * math.sqrt(2.) * self.sense_resistor / VREF
+        self.cs_factor = 32. * self.gscaler_factor
         gscaler, irun, ihold = self._calc_current(run_current, hold_current)
         self.fields.set_field("globalscaler", gscaler)
         self.fields.set_field("ihold", ihold)
         self.fields.set_field("irun", irun)
     def _calc_globalscaler(self, current):
-        globalscaler = int((current * 256. * math.sqrt(2.)
-                            * self.sense_resistor / VREF) + .5)
+        globalscaler = int(current * self.gscaler_factor + .5)
         globalscaler = max(32, globalscaler)
         if globalscaler >= 256:
             globalscaler = 0
@@ -288,25 +290,23 @@ class TMC5160CurrentHelper:
     def _calc_current_bits(self, current, globalscaler):
         if not globalscaler:
             globalscaler = 256
-        cs = int((current * 256. * 32. * math.sqrt(2.) * self.sense_resistor)
-                 / (globalscaler * VREF)
-                 - 1. + .5)
+        cs = int(current * self.cs_factor / globalscaler - 1. + .5)
         return max(0, min(31, cs))
     def _calc_current(self, run_current, hold_current):
         gscaler = self._calc_globalscaler(run_current)
         irun = self._calc_current_bits(run_current, gscaler)
         ihold = self._calc_current_bits(min(hold_current, run_current), gscaler)
         return gscaler, irun, ihold
-    def _calc_current_from_field(self, field_name):
-        globalscaler = self.fields.get_field("globalscaler")
+    def _calc_current_from_bits(self, current_bits, globalscaler):
         if not globalscaler:
             globalscaler = 256
-        bits = self.fields.get_field(field_name)
-        return (globalscaler * (bits + 1) * VREF
-                / (256. * 32. * math.sqrt(2.) * self.sense_resistor))
+        return globalscaler * (current_bits + 1) / self.cs_factor
     def get_current(self):
-        run_current = self._calc_current_from_field("irun")
-        hold_current = self._calc_current_from_field("ihold")
+        irun = self.fields.get_field("irun")
+        ihold = self.fields.get_field("ihold")
+        globalscaler = self.fields.get_field("globalscaler")
+        run_current = self._calc_current_from_bits(irun, globalscaler)
+        hold_current = self._calc_current_from_bits(ihold, globalscaler)
         return run_current, hold_current, self.req_hold_current, MAX_CURRENT
     def set_current(self, run_current, hold_current, print_time):
         self.req_hold_current = hold_current